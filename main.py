@@ -1,23 +1,86 @@
-import glob
+import asyncio
+import base64
+import binascii
+import concurrent.futures
+import copy
+import hashlib
+import html
+import heapq
+import hmac
 import os
+import re
+import secrets
+import shutil
+import stat
+import sys
 import tempfile
+import time
+import uuid
 from typing import Optional, List, Dict
+from urllib.parse import quote, urlsplit
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import lru_cache
 import logging
 
+import aiofiles
+import anyio
 import httpx
+import orjson
+import redis
 import yt_dlp
-from bs4 import BeautifulSoup
-from fastapi import FastAPI, HTTPException, Response, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from async_lru import alru_cache
+from bs4 import BeautifulSoup, SoupStrainer
+from fastapi import FastAPI, HTTPException, Header, Response, BackgroundTasks
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
+from starlette.background import BackgroundTask
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from redis import asyncio as aioredis
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Social Media Downloader API", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown"""
+    # Room for file reads and other threadpool work alongside the yt-dlp process pool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 64
+
+    # One pooled HTTP/2 client for scraping and source proxying, reused across requests
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        headers=SCRAPE_HEADERS,
+        follow_redirects=True,
+        timeout=15.0,
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100),
+    )
+
+    # A per-process random secret only verifies tokens this worker signed itself
+    if 'DOWNLOAD_TOKEN_SECRET' not in os.environ and int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)) > 1:
+        logger.warning(
+            "⚠️  DOWNLOAD_TOKEN_SECRET is not set - with several workers, download tokens "
+            "fail on every worker but the one that issued them and downloads re-extract instead"
+        )
+
+    # Fork the worker pool now so each process builds its YoutubeDL before the first request
+    await run_in_worker(os.getpid)
+
+    yield
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    download_executor.shutdown(wait=False, cancel_futures=True)
+    await app.state.http.aclose()
+
+
+app = FastAPI(
+    title="Social Media Downloader API",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # CORS middleware for Android app
 app.add_middleware(
@@ -29,12 +92,121 @@ app.add_middleware(
 )
 
 
+# Content types for downloaded files, by extension
+MIME_TYPES = {
+    'mp4': 'video/mp4',
+    'webm': 'video/webm',
+    'mkv': 'video/x-matroska',
+    'avi': 'video/x-msvideo',
+    'mov': 'video/quicktime',
+    'flv': 'video/x-flv',
+    'm4a': 'audio/mp4',
+    'mp3': 'audio/mpeg',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'gif': 'image/gif',
+}
+
+# User agents - full browser UA for yt-dlp, short UA for og: tag scraping
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+SCRAPE_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+# Metadata cache (enabled when REDIS_URL is set)
+REDIS_URL = os.environ.get('REDIS_URL')
+# Kept below the lifetime of signed media URLs so cached format URLs stay usable
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 600))
+CACHE_LOCK_TTL = 60
+
+redis_client = aioredis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+# Signs the download tokens handed out by /api/extract; set it so every worker accepts every token
+DOWNLOAD_TOKEN_SECRET = (os.environ.get('DOWNLOAD_TOKEN_SECRET') or secrets.token_hex(32)).encode()
+
+# yt-dlp cache (player JS, signature functions) shared by all workers
+YTDLP_CACHE_DIR = os.environ.get('YTDLP_CACHE_DIR', '/var/cache/yt-dlp')
+
+# Per-worker YoutubeDL instance, built once when each pool process starts
+_worker_ydl = None
+
+
+def _init_worker():
+    """Build the worker's YoutubeDL up front so the first extraction doesn't pay for it"""
+    global _worker_ydl
+    _worker_ydl = yt_dlp.YoutubeDL(get_ytdlp_options(extract_only=True))
+    # Import and instantiate the YouTube extractor now rather than on the first URL
+    _worker_ydl.get_info_extractor('Youtube')
+
+
+# Per-worker YoutubeDL instances for resolving, keyed by their options and evicted oldest first
+YDL_POOL_SIZE = 16
+_ydl_pool: Dict[bytes, yt_dlp.YoutubeDL] = {}
+
+
+def pooled_ydl(ydl_opts: Dict) -> yt_dlp.YoutubeDL:
+    """Return this worker's YoutubeDL for these options, building it on first use"""
+    # Sorted JSON of the options; hooks and other callables are keyed by their repr
+    key = orjson.dumps(ydl_opts, option=orjson.OPT_SORT_KEYS, default=repr)
+    ydl = _ydl_pool.pop(key, None)
+    if ydl is None:
+        if len(_ydl_pool) >= YDL_POOL_SIZE:
+            _ydl_pool.pop(next(iter(_ydl_pool))).close()
+        # YoutubeDL fills in defaults on the dict it's given, which would change the caller's key
+        ydl = yt_dlp.YoutubeDL(dict(ydl_opts))
+    # Re-inserting keeps the dict in least-recently-used order
+    _ydl_pool[key] = ydl
+    return ydl
+
+
+# yt-dlp worker pool - CPU-heavy extraction runs outside the event loop.
+# Every uvicorn worker forks its own pool, so by default the cores are split between them,
+# with a floor of two since extraction mostly waits on the network
+EXTRACT_WORKERS = int(os.environ.get(
+    'EXTRACT_WORKERS',
+    max(2, (os.cpu_count() or 1) // int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))),
+))
+
+
+def _new_executor() -> concurrent.futures.ProcessPoolExecutor:
+    return concurrent.futures.ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, initializer=_init_worker)
+
+
+executor = _new_executor()
+
+
+def rebuild_executor(broken: concurrent.futures.ProcessPoolExecutor):
+    """Replace a pool that broke when a worker died, once however many requests saw it"""
+    global executor
+    if executor is broken:
+        logger.warning("⚠️  yt-dlp worker died, starting a new worker pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        executor = _new_executor()
+
+# Downloads are network/ffmpeg-bound, so threads suffice and skip pickling info dicts
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 16))
+download_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=DOWNLOAD_WORKERS, thread_name_prefix='yt-dlp-download'
+)
+
+# yt-dlp downloads and pipes beyond this many queue instead of fighting over disk and CPU
+MAX_CONCURRENT_DL = int(os.environ.get('MAX_CONCURRENT_DL', os.cpu_count() or 4))
+download_slots = asyncio.Semaphore(MAX_CONCURRENT_DL)
+
+
 # Request Models
 class DownloadRequest(BaseModel):
     url: HttpUrl
     quality: Optional[str] = "best"
 
 
+class MediaDownloadRequest(BaseModel):
+    url: HttpUrl
+    quality: Optional[str] = "best"
+    # From /api/extract; lets the download skip extracting the URL again
+    download_token: Optional[str] = None
+
+
 class FormatDownloadRequest(BaseModel):
     url: HttpUrl
     format_id: Optional[str] = None
@@ -45,13 +217,19 @@ class PhotoDownloadRequest(BaseModel):
     quality: Optional[str] = "best"
 
 
+class BatchRequest(BaseModel):
+    urls: List[HttpUrl] = Field(..., min_length=1, max_length=50)
+
+
 class MediaInfo(BaseModel):
     platform: str
     title: str
     thumbnail: str
     duration: Optional[float]
+    # yt-dlp formats omit their signed CDN URLs; download them by format_id or download_token
     formats: List[Dict]
     author: Optional[str]
+    download_token: Optional[str] = None
 
 
 # Progress tracking
@@ -71,25 +249,58 @@ def progress_hook(d):
         logger.error(f"❌ Download error: {d.get('error', 'unknown error')}")
 
 
+# Page scraping
+# Instagram post kinds: reels/IGTV are video, /p/ is usually a photo post
+_IG_POST_RE = re.compile(r'/(reels?|tv|p)/([A-Za-z0-9_-]+)')
+
+# og: tags are pulled straight from the raw bytes, with property and content in either order
+_OG_META_RE = re.compile(
+    rb'<meta\s[^>]*?(?:'
+    rb'property=["\']og:(?P<p1>video|image|title)["\'][^>]*?content=(?:"(?P<c1>[^"]*)"|\'(?P<s1>[^\']*)\')'
+    rb'|content=(?:"(?P<c2>[^"]*)"|\'(?P<s2>[^\']*)\')[^>]*?property=["\']og:(?P<p2>video|image|title)["\']'
+    rb')',
+    re.IGNORECASE,
+)
+_HEAD_END_RE = re.compile(rb'</head\s*>', re.IGNORECASE)
+
+# LinkedIn pages are only queried for <video>, so the rest of the tree is never built
+_VIDEO_STRAINER = SoupStrainer('video')
+
+
 # Platform Detection
+# Keyed by registrable domain (the host's last two labels), so m.youtube.com and
+# vm.tiktok.com share their parent's entry while notyoutube.com or youtube.com.evil.net miss
+_PLATFORM_BY_HOST = {
+    'youtube.com': 'youtube',
+    'youtu.be': 'youtube',
+    'tiktok.com': 'tiktok',
+    'instagram.com': 'instagram',
+    'facebook.com': 'facebook',
+    'fb.watch': 'facebook',
+    'twitter.com': 'twitter',
+    'x.com': 'twitter',
+    'linkedin.com': 'linkedin',
+}
+
+
+# Bounded so clients sending endless unique URLs can't grow the cache without limit
+@lru_cache(maxsize=4096)
 def detect_platform(url: str) -> str:
     """Detect which platform the URL belongs to"""
-    url_lower = url.lower()
-
-    if 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-        return 'youtube'
-    elif 'tiktok.com' in url_lower:
-        return 'tiktok'
-    elif 'instagram.com' in url_lower:
-        return 'instagram'
-    elif 'facebook.com' in url_lower or 'fb.watch' in url_lower:
-        return 'facebook'
-    elif 'twitter.com' in url_lower or 'x.com' in url_lower:
-        return 'twitter'
-    elif 'linkedin.com' in url_lower:
-        return 'linkedin'
-    else:
-        return 'unknown'
+    # urlsplit lowercases the hostname, so no extra .lower() copy is needed
+    return platform_for_host(urlsplit(url).hostname or '')
+
+
+# Endpoints look up by host, so every URL on a known host hits this cache, not just repeats
+@lru_cache(maxsize=1024)
+def platform_for_host(host: str) -> str:
+    """Map an already-lowercased hostname to its platform"""
+    domain = '.'.join(host.rstrip('.').rsplit('.', 2)[-2:])
+    return _PLATFORM_BY_HOST.get(domain, 'unknown')
+
+
+# Prefer a single progressive MP4 that needs no ffmpeg pass; merge separate streams only as a fallback
+DOWNLOAD_FORMAT = 'best[ext=mp4][acodec!=none][vcodec!=none]/bestvideo[ext=mp4]+bestaudio[ext=m4a]/best'
 
 
 def get_ytdlp_options(extract_only=False, include_progress=False):
@@ -99,7 +310,8 @@ def get_ytdlp_options(extract_only=False, include_progress=False):
         'no_warnings': True,
         'extract_flat': False,
         'nocheckcertificate': True,
-        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'cachedir': YTDLP_CACHE_DIR,
+        'user_agent': USER_AGENT,
         'referer': 'https://www.youtube.com/',
         # Timeout configurations
         'socket_timeout': 30,
@@ -109,14 +321,17 @@ def get_ytdlp_options(extract_only=False, include_progress=False):
         'extractor_retries': 3,
         # HTTP headers
         'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'User-Agent': USER_AGENT,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Language': 'en-us,en;q=0.5',
             'Sec-Fetch-Mode': 'navigate',
         },
         'extractor_args': {
             'youtube': {
-                'player_client': ['android', 'web'],
+                # yt-dlp's default clients are the ones its release can use without a PO token;
+                # android alone gets its HTTPS/DASH formats dropped for lack of one.
+                # Extraction and downloads share them, so listed format_ids resolve for download
+                'player_client': ['default'],
                 'player_skip': ['webpage', 'configs'],
             }
         },
@@ -126,83 +341,461 @@ def get_ytdlp_options(extract_only=False, include_progress=False):
         options['progress_hooks'] = [progress_hook]
         options['quiet'] = False
 
-    if not extract_only:
+    if extract_only:
+        # Metadata listing doesn't need DASH manifests; HLS stays, as some clients list nothing else
+        options['skip_download'] = True
+        options['extractor_args']['youtube']['skip'] = ['dash']
+    else:
         options.update({
-            'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+            'format': DOWNLOAD_FORMAT,
+            # Only used when no progressive stream exists and separate streams must be merged
             'merge_output_format': 'mp4',
-            'postprocessors': [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': 'mp4',
-            }],
         })
 
     return options
 
 
-def cleanup_temp_files(temp_dir: str):
-    """Clean up temporary files and directory"""
+async def cleanup_temp_files(temp_dir: str):
+    """Clean up temporary files and directory in a worker thread, off the event loop"""
     try:
-        for file in glob.glob(os.path.join(temp_dir, '*')):
-            try:
-                os.unlink(file)
-            except Exception as e:
-                logger.warning(f"Failed to delete file {file}: {e}")
-        os.rmdir(temp_dir)
+        await anyio.to_thread.run_sync(shutil.rmtree, temp_dir)
         logger.info(f"🧹 Cleaned up temp directory: {temp_dir}")
     except Exception as e:
         logger.warning(f"Failed to cleanup temp directory {temp_dir}: {e}")
 
 
+# Anything other than word characters, spaces and hyphens is dropped from download filenames
+_TITLE_RE = re.compile(r'[^\w \-]+')
+
+
+def safe_title(title: Optional[str], default: str) -> str:
+    """Strip a media title down to characters that are safe in a filename"""
+    return _TITLE_RE.sub('', title or default).strip()
+
+
+def content_disposition(filename: str) -> str:
+    """Build an attachment header, adding an RFC 5987 name for titles that aren't plain ASCII"""
+    escaped = filename.replace('\\', '\\\\').replace('"', '\\"')
+    if filename.isascii():
+        return f'attachment; filename="{escaped}"'
+    # Sanitized titles keep non-Latin word characters, which a latin-1 header can't carry;
+    # clients that ignore filename* still get the ASCII part of the name
+    stem, dot, ext = escaped.encode('ascii', 'ignore').decode().rpartition('.')
+    fallback = f"{stem.strip() or 'download'}{dot}{ext}" if dot else (ext.strip() or 'download')
+    return f"attachment; filename=\"{fallback}\"; filename*=utf-8''{quote(filename)}"
+
+
+def find_download(outtmpl: str) -> Optional[str]:
+    """Find the file written for a uuid-prefixed outtmpl when yt-dlp doesn't report its path"""
+    directory, template = os.path.split(outtmpl)
+    prefix = template.split('.', 1)[0]
+    try:
+        with os.scandir(directory) as entries:
+            return next((e.path for e in entries if e.name.startswith(prefix) and e.is_file()), None)
+    except OSError:
+        return None
+
+
+def regular_file_stat(path: Optional[str]) -> Optional[os.stat_result]:
+    """Stat a downloaded file once, or return None if it is missing or not a regular file"""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def cache_key(url: str) -> str:
+    """Build the Redis key for a URL's extracted metadata"""
+    return "ytdlp:v1:" + hashlib.sha1(url.encode()).hexdigest()
+
+
+def media_cache_key(platform: str, url: str) -> str:
+    """Build the Redis key for a URL's serialized /api/extract response"""
+    return f"media:{platform}:{hashlib.sha1(url.encode()).hexdigest()}"
+
+
+async def cache_get_bytes(key: str) -> Optional[bytes]:
+    """Read a raw cached value, treating Redis failures as a miss"""
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache read failed for {key}: {e}")
+        return None
+
+
+async def cache_set_bytes(key: str, value: bytes, ttl: int = CACHE_TTL):
+    """Store a raw value in the cache, ignoring Redis failures"""
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(key, ttl, value)
+    except redis.RedisError as e:
+        logger.warning(f"Cache write failed for {key}: {e}")
+
+
+async def cache_get(key: str) -> Optional[Dict]:
+    """Read a cached JSON payload"""
+    raw = await cache_get_bytes(key)
+    return orjson.loads(raw) if raw else None
+
+
+async def cache_set(key: str, value: Dict, ttl: int = CACHE_TTL):
+    """Store a JSON payload in the cache"""
+    await cache_set_bytes(key, orjson.dumps(value, default=str), ttl)
+
+
+async def cache_acquire_lock(lock_key: str) -> bool:
+    """Take the per-URL extraction lock (SET NX EX) so only one worker extracts"""
+    if redis_client is None:
+        return True
+    try:
+        return bool(await redis_client.set(lock_key, 1, nx=True, ex=CACHE_LOCK_TTL))
+    except redis.RedisError as e:
+        logger.warning(f"Cache lock failed for {lock_key}: {e}")
+        return True
+
+
+async def cache_release_lock(lock_key: str):
+    """Release the per-URL extraction lock"""
+    await cache_delete(lock_key)
+
+
+async def cache_delete(key: str):
+    """Remove a key from the cache, ignoring Redis failures"""
+    if redis_client is None:
+        return
+    try:
+        await redis_client.delete(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache delete failed for {key}: {e}")
+
+
+async def cache_wait(key: str, lock_key: str) -> Optional[Dict]:
+    """Wait for another worker holding the lock to publish its result"""
+    for _ in range(CACHE_LOCK_TTL * 2):
+        await asyncio.sleep(0.5)
+        cached = await cache_get(key)
+        if cached is not None:
+            return cached
+        try:
+            if not await redis_client.exists(lock_key):
+                return None
+        except redis.RedisError:
+            return None
+    return None
+
+
+# Download tokens
+def _b64encode(data: bytes) -> bytes:
+    """Unpadded URL-safe base64, so tokens travel in JSON and query strings as-is"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def sign_download_token(payload: Dict, ttl: int = CACHE_TTL) -> str:
+    """Sign a resolved source so /api/download can proxy it without extracting again"""
+    body = _b64encode(orjson.dumps({**payload, 'exp': int(time.time()) + ttl}))
+    signature = _b64encode(hmac.digest(DOWNLOAD_TOKEN_SECRET, body, 'sha256'))
+    return (body + b'.' + signature).decode()
+
+
+def verify_download_token(token: str) -> Optional[Dict]:
+    """Return a download token's payload, or None if it is malformed, forged or expired"""
+    body, _, signature = token.encode().partition(b'.')
+    expected = _b64encode(hmac.digest(DOWNLOAD_TOKEN_SECRET, body, 'sha256'))
+    if not hmac.compare_digest(signature, expected):
+        return None
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(body + b'=' * (-len(body) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError):
+        return None
+    if payload.get('exp', 0) < time.time():
+        return None
+    return payload
+
+
+def download_token_for(url: str, info: Dict) -> Optional[str]:
+    """Token for the best progressive MP4 the extraction found, the one /api/download would pick"""
+    mp4s = [f for f in (info.get('progressive') or {}).values() if f.get('ext') == 'mp4']
+    if not mp4s:
+        return None
+    best = max(mp4s, key=lambda f: f['height'])
+    return sign_download_token({
+        'url': url,
+        'title': info.get('title'),
+        'ext': best['ext'],
+        'direct_url': best['url'],
+        'http_headers': best['http_headers'],
+    })
+
+
+@alru_cache(maxsize=1024, ttl=CACHE_TTL)
 async def get_ytdlp_info(url: str) -> Dict:
-    """Extract video info using yt-dlp"""
-    ydl_opts = get_ytdlp_options(extract_only=True)
+    """Extract video info using yt-dlp, memoized in process (L1) and in Redis (L2) by URL"""
+    key = cache_key(url)
+    cached = await cache_get(key)
+    if cached is not None:
+        logger.info(f"⚡ Cache hit for: {url}")
+        return cached
+
+    lock_key = f"{key}:lock"
+    locked = await cache_acquire_lock(lock_key)
+    if not locked:
+        logger.info(f"⏳ Waiting for in-progress extraction of: {url}")
+        cached = await cache_wait(key, lock_key)
+        if cached is not None:
+            return cached
+
+    try:
+        info = await extract_ytdlp_info(url)
+        await cache_set(key, info)
+        return info
+    finally:
+        if locked:
+            await cache_release_lock(lock_key)
+
+
+# Classifies error messages in one pass; lastgroup names the class that matched first
+_ERROR_CLASS_RE = re.compile(
+    r'(?P<timeout>timeout)|(?P<forbidden>\b403\b|forbidden)|(?P<not_found>\b404\b|not found)',
+    re.IGNORECASE,
+)
+_ERROR_CLASS_STATUS = {'timeout': 408, 'forbidden': 403, 'not_found': 404}
+
+# Client-facing details for errors that only reach the global handler
+_GLOBAL_ERROR_DETAILS = {
+    408: "Download timeout - please try again",
+    403: "Access denied - content may be private or geo-blocked",
+    404: "Content not found - URL may be invalid",
+}
+
+
+def classify_error_message(message: str) -> Optional[int]:
+    """Map an error message to 408, 403 or 404, or None if it matches none of them"""
+    match = _ERROR_CLASS_RE.search(message)
+    return _ERROR_CLASS_STATUS[match.lastgroup] if match else None
+
+
+def http_status(exc: Optional[BaseException]) -> Optional[int]:
+    """Find the HTTP status code behind a yt-dlp error by walking its causes"""
+    for _ in range(8):
+        if exc is None:
+            return None
+        # yt-dlp's networking HTTPError has .status, urllib's has .code
+        status = getattr(exc, 'status', None) or getattr(exc, 'code', None)
+        if isinstance(status, int) and 100 <= status < 600:
+            return status
+        exc_info = getattr(exc, 'exc_info', None)
+        exc = (exc_info[1] if exc_info else None) or getattr(exc, 'cause', None) or exc.__cause__
+    return None
+
+
+def ytdlp_error_status(e: yt_dlp.utils.DownloadError) -> Optional[int]:
+    """Classify a yt-dlp error as 403, 404 or 408, preferring the HTTP status it carries"""
+    status = http_status(e)
+    if status is None:
+        status = classify_error_message(str(e))
+    return status if status in (403, 404, 408) else None
+
+
+def _portable_error(e: yt_dlp.utils.DownloadError) -> yt_dlp.utils.DownloadError:
+    """Copy a DownloadError so it can be pickled back from a worker, keeping its HTTP status"""
+    # exc_info carries a traceback, which can't be pickled back to the parent
+    error = yt_dlp.utils.DownloadError(str(e))
+    error.status = http_status(e)
+    return error
+
 
+# Extractors whose raw formats already have an ext and unique, selector-safe format_ids.
+# Others go through yt-dlp's processing so listed ids match what format selection accepts
+NORMALISED_FORMAT_EXTRACTORS = frozenset({'Youtube'})
+
+
+def _sync_extract(url: str) -> Dict:
+    """Run yt-dlp extraction inside a worker process"""
+    if _worker_ydl is None:
+        _init_worker()
+
+    try:
+        # Skip format selection and URL processing when the raw formats are already listable
+        info = _worker_ydl.extract_info(url, download=False, process=False)
+        if info.get('_type', 'video') != 'video' or info.get('extractor_key') not in NORMALISED_FORMAT_EXTRACTORS:
+            # Redirects and playlists, and raw formats with missing ext or clashing ids, need full processing
+            info = _worker_ydl.process_ie_result(info, download=False)
+    except yt_dlp.utils.DownloadError as e:
+        raise _portable_error(e) from None
+
+    thumbnail = info.get('thumbnail')
+    if not thumbnail and info.get('thumbnails'):
+        thumbnail = info['thumbnails'][-1].get('url')
+
+    # Rank the raw formats first so only the ten that are returned get copied into dicts
+    video_formats = [f for f in info.get('formats') or () if f.get('vcodec') != 'none']
+    top_formats = heapq.nlargest(10, video_formats, key=lambda f: f.get('height') or 0)
+    formats = [
+        {
+            'format_id': f.get('format_id'),
+            'quality': f.get('format_note') or f.get('quality') or 'unknown',
+            'ext': f.get('ext'),
+            'filesize': f.get('filesize'),
+            'height': f.get('height') or 0,
+            'width': f.get('width'),
+            'fps': f.get('fps'),
+        }
+        for f in top_formats
+    ]
+
+    # Single-file formats that can later be proxied by format_id without re-extracting
+    progressive = {
+        f['format_id']: {
+            'url': f['url'],
+            'ext': f.get('ext'),
+            'height': f.get('height') or 0,
+            'http_headers': {'User-Agent': USER_AGENT, **(f.get('http_headers') or {})},
+        }
+        for f in info.get('formats') or ()
+        if f.get('format_id') and f.get('url')
+        and f.get('vcodec') not in (None, 'none') and f.get('acodec') not in (None, 'none')
+        and yt_dlp.utils.determine_protocol(f) in ('http', 'https')
+    }
+
+    return {
+        'title': info.get('title'),
+        'thumbnail': thumbnail,
+        'duration': info.get('duration'),
+        'author': info.get('uploader'),
+        'formats': formats,
+        'progressive': progressive,
+    }
+
+
+def _sync_download(url: str, ydl_opts: Dict, info: Optional[Dict] = None) -> Dict:
+    """Run a yt-dlp download in a download pool thread
+
+    When ``info`` is an already-resolved info dict it is downloaded directly
+    (like ``--load-info-json``) instead of extracting the URL a second time.
+    """
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        if info is not None:
+            # The resolved info is cached and shared, and yt-dlp updates it in place while downloading
+            info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+        else:
+            info = ydl.extract_info(url, download=True)
+
+    # Final path after merging/post-processing, as reported by yt-dlp
+    downloads = info.get('requested_downloads') or [{}]
+    filepath = downloads[-1].get('filepath') or find_download(ydl_opts['outtmpl'])
+    return {'title': info.get('title'), 'filepath': filepath}
+
+
+# Large per-video extras that neither a re-download nor --load-info-json uses
+_UNNEEDED_INFO_KEYS = frozenset({
+    'automatic_captions', 'subtitles', 'thumbnails', 'heatmap', 'description', 'chapters',
+})
+
+
+def _sync_resolve(url: str, ydl_opts: Dict) -> Dict:
+    """Resolve the format yt-dlp would download, inside a worker process"""
+    # Resolve options only vary by format, so repeat URLs reuse an already-built YoutubeDL
+    ydl = pooled_ydl(ydl_opts)
+    try:
+        info = ydl.extract_info(url, download=False)
+    except yt_dlp.utils.DownloadError as e:
+        raise _portable_error(e) from None
+
+    # Cached per URL and pickled back from the worker, so keep only what a download replays:
+    # the chosen formats (re-selecting the same spec picks them again) and no captions or thumbnails
+    chosen = info.get('requested_formats') or [
+        f for f in info.get('formats') or () if f.get('format_id') == info.get('format_id')
+    ]
+    slim_info = {k: v for k, v in info.items() if k not in _UNNEEDED_INFO_KEYS}
+    if chosen:
+        slim_info['formats'] = chosen
+
+    # Merged (video+audio) and fragmented (HLS/DASH) formats still need yt-dlp
+    progressive = not info.get('requested_formats') and info.get('protocol') in ('http', 'https')
+
+    return {
+        'title': info.get('title'),
+        'ext': info.get('ext'),
+        'format_id': info.get('format_id'),
+        # yt-dlp skips its fixups (FixupM3u8, FixupM4a) when writing to stdout, so only
+        # progressive downloads are piped; HLS/DASH and merged ones go through a temp file
+        'pipeable': progressive,
+        'direct_url': info.get('url') if progressive else None,
+        'http_headers': info.get('http_headers') or {},
+        'info': ydl.sanitize_info(slim_info, remove_private_keys=True),
+    }
+
+
+async def run_in_worker(func, *args):
+    """Run a blocking yt-dlp call in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    pool = executor
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except concurrent.futures.process.BrokenProcessPool:
+        # One dead worker (OOM kill, segfault) breaks the whole pool - start a fresh one and retry once
+        rebuild_executor(pool)
+        return await loop.run_in_executor(executor, func, *args)
+
+
+async def run_download(url: str, ydl_opts: Dict, info: Optional[Dict] = None) -> Dict:
+    """Run a blocking yt-dlp download in the download thread pool"""
+    async with download_slots:
+        return await asyncio.get_running_loop().run_in_executor(
+            download_executor, _sync_download, url, ydl_opts, info
+        )
+
+
+# Concurrent identical resolves share one task, and an extract-then-download pair resolves once
+@alru_cache(maxsize=256, ttl=CACHE_TTL)
+async def resolve_source(url: str, format_spec: str) -> Dict:
+    """Resolve what yt-dlp would download for a URL and format, memoized in process"""
+    ydl_opts = get_ytdlp_options(include_progress=True)
+    ydl_opts.update({'noplaylist': True, 'format': format_spec})
+    return await run_in_worker(_sync_resolve, url, ydl_opts)
+
+
+async def with_fallback(primary, fallback, exceptions):
+    """Await primary, running fallback alongside it so a failure doesn't pay for both in series"""
+    backup = asyncio.ensure_future(fallback)
+    # Retrieve the backup's outcome whatever happens, so an unused failure isn't logged as unhandled
+    backup.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        return await primary
+    except exceptions:
+        return await backup
+    finally:
+        backup.cancel()
+
+
+async def extract_ytdlp_info(url: str) -> Dict:
+    """Extract video info using yt-dlp"""
     try:
         logger.info(f"📊 Extracting info from: {url}")
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-
-            formats = []
-            if 'formats' in info:
-                for f in info['formats']:
-                    if f.get('vcodec') != 'none':
-                        formats.append({
-                            'format_id': f.get('format_id'),
-                            'quality': f.get('format_note', f.get('quality', 'unknown')),
-                            'ext': f.get('ext'),
-                            'filesize': f.get('filesize'),
-                            'url': f.get('url'),
-                            'height': f.get('height'),
-                            'width': f.get('width'),
-                            'fps': f.get('fps'),
-                        })
-
-            formats.sort(key=lambda x: x.get('height', 0) if x.get('height') else 0, reverse=True)
-
-            logger.info(f"✅ Extracted info: {info.get('title')} ({len(formats)} formats)")
-
-            return {
-                'title': info.get('title'),
-                'thumbnail': info.get('thumbnail'),
-                'duration': info.get('duration'),
-                'author': info.get('uploader'),
-                'formats': formats[:10],
-                'direct_url': info.get('url'),
-            }
+        info = await run_in_worker(_sync_extract, url)
+        logger.info(f"✅ Extracted info: {info.get('title')} ({len(info['formats'])} formats)")
+        return info
     except yt_dlp.utils.DownloadError as e:
         error_msg = str(e)
         logger.error(f"❌ yt-dlp error: {error_msg}")
-        if "403" in error_msg or "Forbidden" in error_msg:
+        status = ytdlp_error_status(e)
+        if status == 403:
             raise HTTPException(
                 status_code=403,
                 detail="Access denied - content may be private or geo-blocked"
             )
-        elif "404" in error_msg or "not found" in error_msg.lower():
+        elif status == 404:
             raise HTTPException(
                 status_code=404,
                 detail="Content not found - URL may be invalid"
             )
-        elif "timeout" in error_msg.lower():
+        elif status == 408:
             raise HTTPException(
                 status_code=408,
                 detail="Request timeout - please try again"
@@ -215,30 +808,65 @@ async def get_ytdlp_info(url: str) -> Dict:
 
 async def get_instagram_info(url: str) -> Dict:
     """Extract Instagram media info"""
-    try:
-        return await get_ytdlp_info(url)
-    except Exception:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+    match = _IG_POST_RE.search(urlsplit(url).path)
+    if match and match.group(1) == 'p':
+        # Photo posts are fully described by their og: tags - skip the yt-dlp pass
+        return await scrape_instagram_og(url)
+
+    # yt-dlp gives the richer result; the og: scrape races it so a yt-dlp failure costs no extra round trip
+    return await with_fallback(
+        get_ytdlp_info(url),
+        scrape_instagram_og(url),
+        (yt_dlp.utils.DownloadError, HTTPException),
+    )
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, headers=headers, follow_redirects=True)
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            og_video = soup.find('meta', property='og:video')
-            og_image = soup.find('meta', property='og:image')
-            og_title = soup.find('meta', property='og:title')
-
-            return {
-                'title': og_title['content'] if og_title else 'Instagram Post',
-                'thumbnail': og_image['content'] if og_image else '',
-                'formats': [{
-                    'url': og_video['content'] if og_video else og_image['content'],
-                    'quality': 'original',
-                    'ext': 'mp4' if og_video else 'jpg'
-                }]
-            }
+
+def og_tags(content: bytes, encoding: Optional[str] = None) -> Dict[str, str]:
+    """Collect og:video/og:image/og:title from raw HTML, first occurrence of each winning"""
+    og = {}
+    for match in _OG_META_RE.finditer(content):
+        if match['p1']:
+            prop, value = match['p1'], match['c1'] if match['c1'] is not None else match['s1']
+        else:
+            prop, value = match['p2'], match['c2'] if match['c2'] is not None else match['s2']
+        og.setdefault('og:' + prop.decode().lower(), html.unescape(value.decode(encoding or 'utf-8', 'replace')))
+    return og
+
+
+async def find_og_image(url: str) -> Optional[str]:
+    """Stream a page only as far as its og:image tag and return the image URL"""
+    buffer = b''
+    async with app.state.http.stream('GET', url) as response:
+        async for chunk in response.aiter_bytes():
+            # Keep only the tail of the previous data, in case a tag straddles two chunks
+            buffer = buffer[-2048:] + chunk
+            image_url = og_tags(buffer, response.encoding).get('og:image')
+            if image_url:
+                return image_url
+            # og: tags only appear in <head>, so the body never needs to be downloaded
+            if _HEAD_END_RE.search(buffer):
+                return None
+    return None
+
+
+async def scrape_instagram_og(url: str) -> Dict:
+    """Extract Instagram media info from the page's og: meta tags"""
+    response = await app.state.http.get(url)
+    og = og_tags(response.content, response.encoding)
+    og_video = og.get('og:video')
+    og_image = og.get('og:image')
+    if not (og_video or og_image):
+        raise HTTPException(status_code=404, detail="No media found")
+
+    return {
+        'title': og.get('og:title') or 'Instagram Post',
+        'thumbnail': og_image or '',
+        'formats': [{
+            'url': og_video or og_image,
+            'quality': 'original',
+            'ext': 'mp4' if og_video else 'jpg'
+        }]
+    }
 
 
 async def get_twitter_info(url: str) -> Dict:
@@ -253,27 +881,180 @@ async def get_facebook_info(url: str) -> Dict:
 
 async def get_linkedin_info(url: str) -> Dict:
     """Extract LinkedIn media info"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
+    response = await app.state.http.get(url)
+    soup = BeautifulSoup(response.content, 'lxml', parse_only=_VIDEO_STRAINER)
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.get(url, headers=headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        video_tag = soup.find('video')
-        if video_tag and video_tag.get('src'):
-            return {
-                'title': 'LinkedIn Video',
-                'thumbnail': video_tag.get('poster', ''),
-                'formats': [{
-                    'url': video_tag['src'],
-                    'quality': 'original',
-                    'ext': 'mp4'
-                }]
-            }
-        else:
-            raise HTTPException(status_code=404, detail="No video found in LinkedIn post")
+    video_tag = soup.find('video')
+    if video_tag and video_tag.get('src'):
+        return {
+            'title': 'LinkedIn Video',
+            'thumbnail': video_tag.get('poster', ''),
+            'formats': [{
+                'url': video_tag['src'],
+                'quality': 'original',
+                'ext': 'mp4'
+            }]
+        }
+    else:
+        raise HTTPException(status_code=404, detail="No video found in LinkedIn post")
+
+
+async def stream_from_source(
+    source: Dict, title: str, range_header: Optional[str] = None
+) -> Optional[StreamingResponse]:
+    """Proxy a progressive media URL straight to the client, or None if the source refuses"""
+    request_headers = dict(source['http_headers'])
+    # The body is relayed undecoded, so the origin must not compress it
+    request_headers['Accept-Encoding'] = 'identity'
+    if range_header:
+        # Let players seek by passing the client's byte range through to the origin
+        request_headers['Range'] = range_header
+
+    try:
+        client = app.state.http
+        upstream = await client.send(
+            client.build_request('GET', source['direct_url'], headers=request_headers),
+            stream=True,
+        )
+    except httpx.HTTPError as e:
+        logger.warning(f"Direct stream failed, falling back to yt-dlp download: {e}")
+        return None
+
+    if upstream.status_code not in (200, 206):
+        logger.warning(f"Source returned {upstream.status_code}, falling back to yt-dlp download")
+        await upstream.aclose()
+        return None
+
+    file_ext = source.get('ext') or 'mp4'
+    headers = {'Content-Disposition': content_disposition(f"{title}.{file_ext}")}
+    for name in ('Content-Length', 'Content-Range', 'Accept-Ranges'):
+        if name in upstream.headers:
+            headers[name] = upstream.headers[name]
+
+    logger.info(f"🔗 Streaming directly from source ({headers.get('Content-Length', 'unknown')} bytes)")
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        media_type=upstream.headers.get('content-type', 'video/mp4'),
+        status_code=upstream.status_code,
+        headers=headers,
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+async def stream_from_ytdlp(source: Dict, title: str) -> Optional[StreamingResponse]:
+    """Pipe a progressive download from a yt-dlp subprocess to the client, or None if it fails"""
+    # The slot is held for the whole stream and given back by cleanup(). It is taken before the
+    # info file exists, so a client that gives up while queued leaves nothing behind
+    await download_slots.acquire()
+    info_path = None
+    try:
+        fd, info_path = tempfile.mkstemp(suffix='.info.json')
+        os.close(fd)
+        async with aiofiles.open(info_path, 'wb') as f:
+            await f.write(orjson.dumps(source['info'], default=str))
+
+        # --load-info-json replays the resolved info, so the URL isn't extracted a second time
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'yt_dlp',
+            '--load-info-json', info_path,
+            '--format', source['format_id'],
+            '--output', '-',
+            '--quiet', '--no-warnings',
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except BaseException:
+        download_slots.release()
+        if info_path:
+            os.unlink(info_path)
+        raise
+
+    # Drained alongside stdout, so a chatty yt-dlp can never block on a full stderr pipe
+    stderr_output = asyncio.ensure_future(proc.stderr.read())
+    # Set once stdout hits EOF; until then an exiting response means the client went away
+    drained = False
+
+    async def cleanup():
+        try:
+            killed = not drained and proc.returncode is None
+            if killed:
+                proc.kill()
+            await proc.wait()
+            errors = (await stderr_output).decode(errors='replace').strip()
+            if proc.returncode and not killed:
+                logger.error(f"❌ yt-dlp pipe exited with {proc.returncode}: {errors or 'no error output'}")
+        finally:
+            stderr_output.cancel()
+            os.unlink(info_path)
+            download_slots.release()
+
+    # Wait for the first bytes so a failed start can still fall back to a temp-file download
+    try:
+        first_chunk = await proc.stdout.read(1 << 20)
+    except BaseException:
+        await cleanup()
+        raise
+    if not first_chunk:
+        drained = True
+        await cleanup()
+        logger.warning("yt-dlp pipe produced no data, falling back to temp-file download")
+        return None
+
+    async def body():
+        nonlocal drained
+        yield first_chunk
+        while chunk := await proc.stdout.read(1 << 20):
+            yield chunk
+        drained = True
+
+    file_ext = source.get('ext') or 'mp4'
+    logger.info(f"🚰 Piping yt-dlp output straight to the client")
+    return StreamingResponse(
+        body(),
+        media_type=MIME_TYPES.get(file_ext.lower(), 'video/mp4'),
+        headers={'Content-Disposition': content_disposition(f"{title}.{file_ext}")},
+        background=BackgroundTask(cleanup),
+    )
+
+
+# Only the head of the file is hinted - the kernel's own readahead keeps up once sending starts,
+# and asking for a multi-GB file at once would evict everything else from the page cache
+PREFETCH_BYTES = 8 << 20
+
+
+def prefetch_file(path: str):
+    """Ask the kernel to start reading the head of a file into the page cache before it is served"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, PREFETCH_BYTES, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning(f"Readahead hint failed for {path}: {e}")
+
+
+class MediaFileResponse(FileResponse):
+    """FileResponse that reads 1 MiB per worker-thread hop instead of Starlette's 64 KiB"""
+    chunk_size = 1 << 20
+
+    async def __call__(self, scope, receive, send):
+        # The open and fadvise syscalls can block on a busy disk, so they run off the event loop
+        await anyio.to_thread.run_sync(prefetch_file, self.path)
+        await super().__call__(scope, receive, send)
+
+
+# Extract handler per detected platform
+HANDLERS = {
+    'youtube': get_ytdlp_info,
+    'tiktok': get_ytdlp_info,
+    'instagram': get_instagram_info,
+    'twitter': get_twitter_info,
+    'facebook': get_facebook_info,
+    'linkedin': get_linkedin_info,
+}
 
 
 # Main API Endpoints
@@ -287,13 +1068,21 @@ async def root():
     }
 
 
+def _sync_health_check():
+    """Confirm yt-dlp can build a YoutubeDL instance"""
+    with yt_dlp.YoutubeDL({'quiet': True}):
+        pass
+
+
 @app.get("/api/health")
 async def health_check():
     """Enhanced health check with dependency status"""
     try:
-        # Test yt-dlp
-        with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-            pass
+        # Test yt-dlp - off the event loop, since building a YoutubeDL loads every extractor
+        await anyio.to_thread.run_sync(_sync_health_check)
+        # submit() raises at once on a pool broken by a dead worker; the job itself isn't awaited,
+        # so probes never queue behind a long extraction
+        executor.submit(os.getpid)
 
         return {
             "status": "healthy",
@@ -310,121 +1099,160 @@ async def health_check():
         }
 
 
-@app.post("/api/extract", response_model=MediaInfo)
-async def extract_media(request: DownloadRequest):
-    """Extract media information from URL"""
-    url = str(request.url)
-    logger.info(f"🔍 Extract request for: {url}")
-
-    platform = detect_platform(url)
+async def extract_one(request_url: HttpUrl) -> bytes:
+    """Extract media information for one URL as validated MediaInfo JSON"""
+    url = str(request_url)
+    platform = platform_for_host(request_url.host or '')
     if platform == 'unknown':
         raise HTTPException(status_code=400, detail="Unsupported platform")
 
-    handlers = {
-        'youtube': get_ytdlp_info,
-        'tiktok': get_ytdlp_info,
-        'instagram': get_instagram_info,
-        'twitter': get_twitter_info,
-        'facebook': get_facebook_info,
-        'linkedin': get_linkedin_info,
-    }
+    # Cache hits are already-validated JSON - return the bytes as-is
+    key = media_cache_key(platform, url)
+    cached = await cache_get_bytes(key)
+    if cached is not None:
+        return cached
 
-    info = await handlers[platform](url)
+    info = await HANDLERS[platform](url)
 
-    result = MediaInfo(
+    # Built from our own handlers' output, so skip re-validating it field by field
+    result = MediaInfo.model_construct(
         platform=platform,
-        title=info.get('title', 'Untitled'),
-        thumbnail=info.get('thumbnail', ''),
+        title=info.get('title') or 'Untitled',
+        thumbnail=info.get('thumbnail') or '',
         duration=info.get('duration'),
-        formats=info.get('formats', []),
-        author=info.get('author')
+        formats=info.get('formats') or [],
+        author=info.get('author'),
+        download_token=download_token_for(url, info),
     )
 
-    return result
+    payload = result.model_dump_json().encode()
+    await cache_set_bytes(key, payload)
+    return payload
+
+
+@app.post("/api/extract", response_model=MediaInfo)
+async def extract_media(request: DownloadRequest):
+    """Extract media information from URL"""
+    logger.info(f"🔍 Extract request for: {request.url}")
+    return Response(content=await extract_one(request.url), media_type="application/json")
+
+
+@app.post("/api/extract_batch")
+async def extract_batch(request: BatchRequest):
+    """Extract media information for several URLs concurrently"""
+    logger.info(f"🔍 Batch extract request for {len(request.urls)} URLs")
+    results = await asyncio.gather(*(extract_one(u) for u in request.urls), return_exceptions=True)
+
+    # Results keep the request order; failed URLs become error entries
+    parts = []
+    for url, result in zip(request.urls, results):
+        if isinstance(result, bytes):
+            parts.append(result)
+        elif isinstance(result, HTTPException):
+            parts.append(orjson.dumps({'url': str(url), 'status_code': result.status_code, 'detail': result.detail}))
+        else:
+            logger.error(f"❌ Batch extract error for {url}: {result}")
+            parts.append(orjson.dumps({'url': str(url), 'status_code': 500, 'detail': f"Server error: {result}"}))
+
+    return Response(content=b'[' + b','.join(parts) + b']', media_type="application/json")
+
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(url: HttpUrl):
+    """Drop cached metadata for a URL from the in-process and Redis caches"""
+    url = str(url)
+    get_ytdlp_info.cache_invalidate(url)
+    resolve_source.cache_invalidate(url, DOWNLOAD_FORMAT)
+    await cache_delete(cache_key(url))
+    await cache_delete(media_cache_key(detect_platform(url), url))
+    logger.info(f"🗑️  Invalidated cache for: {url}")
+    return {"url": url, "invalidated": True}
 
 
 @app.post("/api/download")
-async def download_media_streaming(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def download_media_streaming(
+    request: MediaDownloadRequest,
+    background_tasks: BackgroundTasks,
+    range_header: Optional[str] = Header(None, alias='Range'),
+):
     """Download media file with streaming (memory efficient)"""
     url = str(request.url)
     logger.info(f"⬇️  Download request - URL: {url}, Quality: {request.quality}")
 
-    platform = detect_platform(url)
+    platform = platform_for_host(request.url.host or '')
     if platform == 'unknown':
         raise HTTPException(status_code=400, detail="Unsupported platform")
 
-    temp_dir = tempfile.mkdtemp()
-    logger.info(f"📁 Created temp directory: {temp_dir}")
+    # A token from /api/extract already carries the resolved source, so skip extracting again
+    token = request.download_token and verify_download_token(request.download_token)
+    if token and token['url'] == url:
+        title = safe_title(token.get('title'), 'downloaded_video')
+        response = await stream_from_source(token, title, range_header)
+        if response is not None:
+            return response
 
-    try:
-        output_template = os.path.join(temp_dir, 'video')
+    temp_dir = None
 
+    try:
         ydl_opts = get_ytdlp_options(include_progress=True)
-        ydl_opts['outtmpl'] = output_template
         ydl_opts['noplaylist'] = True
 
+        source = await resolve_source(url, ydl_opts['format'])
+        title = safe_title(source.get('title'), 'downloaded_video')
+        logger.info(f"📝 Title: {title}")
+
+        if source['direct_url']:
+            response = await stream_from_source(source, title, range_header)
+            if response is not None:
+                return response
+
+        if source['pipeable']:
+            response = await stream_from_ytdlp(source, title)
+            if response is not None:
+                return response
+
+        temp_dir = tempfile.mkdtemp()
+        logger.info(f"📁 Created temp directory: {temp_dir}")
+        ydl_opts['outtmpl'] = os.path.join(temp_dir, uuid.uuid4().hex + '.%(ext)s')
+
         logger.info(f"🚀 Starting download with yt-dlp...")
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'downloaded_video')
-            title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-            logger.info(f"📝 Title: {title}")
+        info = await run_download(url, ydl_opts, source['info'])
 
-        downloaded_files = glob.glob(os.path.join(temp_dir, 'video*'))
-        if not downloaded_files:
+        downloaded_file = info['filepath']
+        file_stat = regular_file_stat(downloaded_file)
+        if file_stat is None:
             raise HTTPException(status_code=400, detail="No file was downloaded")
 
-        downloaded_file = downloaded_files[0]
-        file_size = os.path.getsize(downloaded_file)
-        logger.info(f"📦 Downloaded file: {downloaded_file} ({file_size} bytes)")
+        logger.info(f"📦 Downloaded file: {downloaded_file} ({file_stat.st_size} bytes)")
 
         file_ext = os.path.splitext(downloaded_file)[1][1:] or 'mp4'
 
-        mime_types = {
-            'mp4': 'video/mp4',
-            'webm': 'video/webm',
-            'mkv': 'video/x-matroska',
-            'avi': 'video/x-msvideo',
-            'mov': 'video/quicktime',
-            'flv': 'video/x-flv',
-        }
-        mime_type = mime_types.get(file_ext, 'video/mp4')
+        mime_type = MIME_TYPES.get(file_ext.lower(), 'video/mp4')
 
-        # Stream the file in chunks
-        def file_streamer():
-            try:
-                with open(downloaded_file, 'rb') as f:
-                    while chunk := f.read(8192):  # 8KB chunks
-                        yield chunk
-                logger.info(f"✅ Streaming completed")
-            except Exception as e:
-                logger.error(f"❌ Streaming error: {str(e)}")
-                raise
-
-        # Schedule cleanup after streaming completes
+        # Schedule cleanup after the file has been sent
         background_tasks.add_task(cleanup_temp_files, temp_dir)
 
-        return StreamingResponse(
-            file_streamer(),
+        # Hand over our stat so FileResponse doesn't stat the file again
+        return MediaFileResponse(
+            downloaded_file,
             media_type=mime_type,
-            headers={
-                'Content-Disposition': f'attachment; filename="{title}.{file_ext}"',
-                'Content-Length': str(file_size),
-                'Accept-Ranges': 'bytes',
-            }
+            filename=f"{title}.{file_ext}",
+            stat_result=file_stat,
         )
 
     except yt_dlp.utils.DownloadError as e:
-        cleanup_temp_files(temp_dir)
+        if temp_dir:
+            await cleanup_temp_files(temp_dir)
         error_msg = str(e)
         logger.error(f"❌ yt-dlp error: {error_msg}")
 
-        if "403" in error_msg or "Forbidden" in error_msg:
+        status = ytdlp_error_status(e)
+        if status == 403:
             raise HTTPException(
                 status_code=403,
                 detail="Access denied - content may be private or geo-blocked"
             )
-        elif "timeout" in error_msg.lower():
+        elif status == 408:
             raise HTTPException(
                 status_code=408,
                 detail="Download timeout - please try again"
@@ -432,74 +1260,88 @@ async def download_media_streaming(request: DownloadRequest, background_tasks: B
         raise HTTPException(status_code=400, detail=f"Download failed: {error_msg}")
 
     except Exception as e:
-        cleanup_temp_files(temp_dir)
+        if temp_dir:
+            await cleanup_temp_files(temp_dir)
         logger.error(f"❌ Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 
 @app.post("/api/download_format")
-async def download_format_streaming(request: FormatDownloadRequest, background_tasks: BackgroundTasks):
+async def download_format_streaming(
+    request: FormatDownloadRequest,
+    background_tasks: BackgroundTasks,
+    range_header: Optional[str] = Header(None, alias='Range'),
+):
     """Download specific format with streaming"""
     url = str(request.url)
     logger.info(f"⬇️  Format download - URL: {url}, Format: {request.format_id}")
 
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = None
 
     try:
-        output_template = os.path.join(temp_dir, 'video')
-
         download_opts = get_ytdlp_options(include_progress=True)
-        download_opts['outtmpl'] = output_template
         download_opts['noplaylist'] = True
 
         if request.format_id:
             download_opts['format'] = request.format_id
             logger.info(f"🎯 Using specific format: {request.format_id}")
+
+            # A recent /api/extract already resolved this format - proxy it without extracting again.
+            # Served from the in-process cache or Redis, so it works without REDIS_URL too
+            try:
+                cached = await get_ytdlp_info(url)
+            except HTTPException:
+                cached = None
+            source = cached and cached.get('progressive', {}).get(request.format_id)
+            if source:
+                title = safe_title(cached.get('title'), 'downloaded_video')
+                response = await stream_from_source({**source, 'direct_url': source['url']}, title, range_header)
+                if response is not None:
+                    logger.info(f"⚡ Using cached format URL for: {url}")
+                    return response
         else:
-            download_opts['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+            download_opts['format'] = DOWNLOAD_FORMAT
             download_opts['merge_output_format'] = 'mp4'
 
-        with yt_dlp.YoutubeDL(download_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'downloaded_video')
-            title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
+        source = await resolve_source(url, download_opts['format'])
+        title = safe_title(source.get('title'), 'downloaded_video')
+
+        if source['direct_url']:
+            response = await stream_from_source(source, title, range_header)
+            if response is not None:
+                return response
+
+        if source['pipeable']:
+            response = await stream_from_ytdlp(source, title)
+            if response is not None:
+                return response
 
-        downloaded_files = glob.glob(os.path.join(temp_dir, 'video*'))
-        if not downloaded_files:
+        temp_dir = tempfile.mkdtemp()
+        download_opts['outtmpl'] = os.path.join(temp_dir, uuid.uuid4().hex + '.%(ext)s')
+
+        info = await run_download(url, download_opts, source['info'])
+
+        downloaded_file = info['filepath']
+        file_stat = regular_file_stat(downloaded_file)
+        if file_stat is None:
             raise HTTPException(status_code=400, detail="No file was downloaded")
 
-        downloaded_file = downloaded_files[0]
-        file_size = os.path.getsize(downloaded_file)
         file_ext = os.path.splitext(downloaded_file)[1][1:] or 'mp4'
 
-        mime_types = {
-            'mp4': 'video/mp4',
-            'webm': 'video/webm',
-            'mkv': 'video/x-matroska',
-            'm4a': 'audio/mp4',
-            'mp3': 'audio/mpeg',
-        }
-        mime_type = mime_types.get(file_ext, 'video/mp4')
-
-        def file_streamer():
-            with open(downloaded_file, 'rb') as f:
-                while chunk := f.read(8192):
-                    yield chunk
+        mime_type = MIME_TYPES.get(file_ext.lower(), 'video/mp4')
 
         background_tasks.add_task(cleanup_temp_files, temp_dir)
 
-        return StreamingResponse(
-            file_streamer(),
+        return MediaFileResponse(
+            downloaded_file,
             media_type=mime_type,
-            headers={
-                'Content-Disposition': f'attachment; filename="{title}.{file_ext}"',
-                'Content-Length': str(file_size),
-                'Accept-Ranges': 'bytes',
-            }
+            filename=f"{title}.{file_ext}",
+            stat_result=file_stat,
         )
 
     except Exception as e:
-        cleanup_temp_files(temp_dir)
+        if temp_dir:
+            await cleanup_temp_files(temp_dir)
         logger.error(f"❌ Download error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Download failed: {str(e)}")
 
@@ -510,53 +1352,41 @@ async def download_photo_streaming(request: PhotoDownloadRequest, background_tas
     url = str(request.url)
     logger.info(f"📸 Photo download - URL: {url}")
 
-    platform = detect_platform(url)
+    platform = platform_for_host(request.url.host or '')
     if platform == 'unknown':
         raise HTTPException(status_code=400, detail="Unsupported platform")
 
     temp_dir = tempfile.mkdtemp()
 
     try:
-        output_template = os.path.join(temp_dir, 'photo')
-
         ydl_opts = get_ytdlp_options(include_progress=True)
         ydl_opts.update({
             'format': 'best',
-            'outtmpl': output_template,
+            'outtmpl': os.path.join(temp_dir, uuid.uuid4().hex + '.%(ext)s'),
             'noplaylist': True,
             'skip_download': False,
             'writethumbnail': False,
         })
 
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                title = info.get('title', 'downloaded_photo')
-                title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-
-            downloaded_files = glob.glob(os.path.join(temp_dir, 'photo*'))
-            if downloaded_files:
-                downloaded_file = downloaded_files[0]
-            else:
+            info = await run_download(url, ydl_opts)
+            title = safe_title(info.get('title'), 'downloaded_photo')
+
+            downloaded_file = info['filepath']
+            file_stat = regular_file_stat(downloaded_file)
+            if file_stat is None:
                 raise Exception("No file downloaded")
 
         except Exception:
             # Fallback to direct HTTP download
-            async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-                response = await client.get(url, headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                })
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                image_url = None
-                og_image = soup.find('meta', property='og:image')
-                if og_image and og_image.get('content'):
-                    image_url = og_image['content']
-
-                if not image_url:
-                    raise HTTPException(status_code=404, detail="No image found")
-
-                img_response = await client.get(image_url)
+            client = app.state.http
+            # Stops reading the page once og:image is known, so the image request starts straight away
+            image_url = await find_og_image(url)
+            if not image_url:
+                raise HTTPException(status_code=404, detail="No image found")
+
+            # Written to disk as it arrives, so the image is never held in memory whole
+            async with client.stream('GET', image_url) as img_response:
                 if img_response.status_code != 200:
                     raise HTTPException(status_code=400, detail="Failed to download image")
 
@@ -568,48 +1398,45 @@ async def download_photo_streaming(request: PhotoDownloadRequest, background_tas
                     ext = 'webp'
 
                 downloaded_file = os.path.join(temp_dir, f'photo.{ext}')
-                with open(downloaded_file, 'wb') as f:
-                    f.write(img_response.content)
+                async with aiofiles.open(downloaded_file, 'wb') as f:
+                    async for chunk in img_response.aiter_bytes(1 << 16):
+                        await f.write(chunk)
+            file_stat = os.stat(downloaded_file)
 
-                title = "downloaded_photo"
+            title = "downloaded_photo"
 
-        file_size = os.path.getsize(downloaded_file)
         file_ext = os.path.splitext(downloaded_file)[1][1:] or 'jpg'
 
-        mime_types = {
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'png': 'image/png',
-            'webp': 'image/webp',
-            'gif': 'image/gif',
-        }
-        mime_type = mime_types.get(file_ext.lower(), 'image/jpeg')
-
-        def file_streamer():
-            with open(downloaded_file, 'rb') as f:
-                while chunk := f.read(8192):
-                    yield chunk
+        mime_type = MIME_TYPES.get(file_ext.lower(), 'image/jpeg')
 
         background_tasks.add_task(cleanup_temp_files, temp_dir)
 
-        return StreamingResponse(
-            file_streamer(),
+        return MediaFileResponse(
+            downloaded_file,
             media_type=mime_type,
-            headers={
-                'Content-Disposition': f'attachment; filename="{title}.{file_ext}"',
-                'Content-Length': str(file_size),
-            }
+            filename=f"{title}.{file_ext}",
+            stat_result=file_stat,
         )
 
     except HTTPException:
-        cleanup_temp_files(temp_dir)
+        await cleanup_temp_files(temp_dir)
         raise
     except Exception as e:
-        cleanup_temp_files(temp_dir)
+        await cleanup_temp_files(temp_dir)
         logger.error(f"❌ Photo download error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Failed to download photo: {str(e)}")
 
 
+# HTTPException handler - FastAPI's default renders these with the stdlib json encoder
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request, exc: StarletteHTTPException):
+    return ORJSONResponse(
+        {"detail": exc.detail},
+        status_code=exc.status_code,
+        headers=getattr(exc, 'headers', None),
+    )
+
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc: Exception):
@@ -618,25 +1445,15 @@ async def global_exception_handler(request, exc: Exception):
 
     logger.error(f"🔥 Global error: {error_type} - {error_msg}")
 
-    if "timeout" in error_msg.lower():
-        return Response(
-            status_code=408,
-            content=f'{{"detail": "Download timeout - please try again"}}'
-        )
-    elif "403" in error_msg or "forbidden" in error_msg.lower():
-        return Response(
-            status_code=403,
-            content=f'{{"detail": "Access denied - content may be private or geo-blocked"}}'
-        )
-    elif "404" in error_msg or "not found" in error_msg.lower():
-        return Response(
-            status_code=404,
-            content=f'{{"detail": "Content not found - URL may be invalid"}}'
-        )
-    else:
-        return Response(
+    status = classify_error_message(error_msg)
+    if status is None:
+        return ORJSONResponse(
             status_code=500,
-            content=f'{{"detail": "Server error: {error_msg}"}}'
+            content={"detail": f"Server error: {error_msg}"}
         )
+    return ORJSONResponse(
+        status_code=status,
+        content={"detail": _GLOBAL_ERROR_DETAILS[status]}
+    )
 
-# Run with: uvicorn main:app --reload --host 0.0.0.0 --port 8000
\ No newline at end of file
+# Run with: uvicorn main:app --workers $(nproc) --loop uvloop --http httptools --no-access-log --host 0.0.0.0 --port 8000
\ No newline at end of file